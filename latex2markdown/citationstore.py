@@ -0,0 +1,137 @@
+"""Shared citation store for converting many papers to one site."""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+# bump when rendering of bib entries changes to invalidate stored entries
+STOREVERSION = 2
+
+
+def bibhash(bib: dict) -> str:
+    """Hash bib data and store version for memoising rendered entries."""
+    data = json.dumps([STOREVERSION, bib], sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def bibanchor(key: str, entryhash: str) -> str:
+    """Anchor of a bib entry on the shared references page."""
+    return f"{key}-{entryhash[:8]}"
+
+
+@contextmanager
+def lockedstore(storedir: str):
+    """Hold exclusive lock on store, parallel make runs share it."""
+    os.makedirs(storedir, exist_ok=True)
+    with open(os.path.join(storedir, ".lock"), "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def readstore(storedir: str) -> dict:
+    """Read store of rendered entries as key: hash: entry."""
+    storefile = os.path.join(storedir, "citations.json")
+    if not os.path.exists(storefile):
+        return {}
+    with open(storefile) as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print(f"broken citation store {storefile}, starting from scratch",
+                  file=sys.stderr)
+            return {}
+
+
+def writestorefile(storedir: str, filename: str, content: str):
+    """Write file in store atomically."""
+    fd, tmpname = tempfile.mkstemp(prefix=filename + ".", suffix=".tmp",
+                                   dir=storedir)
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+    os.chmod(tmpname, 0o644)
+    os.replace(tmpname, os.path.join(storedir, filename))
+
+
+def renderreferences(store: dict) -> str:
+    """Render shared references page from store."""
+    lines = ["# References\n\n"]
+    for key in sorted(store):
+        for entryhash in sorted(store[key]):
+            lines.append(store[key][entryhash]["markdown"])
+    return "".join(lines)
+
+
+def forgetpaper(store: dict, paper: str, entries: dict):
+    """Forget citations paper doesn't make anymore, drop uncited entries."""
+    for key in list(store):
+        for entryhash in list(store[key]):
+            if (key, entryhash) in entries:
+                continue
+            papers = store[key][entryhash]["papers"]
+            if paper in papers:
+                papers.remove(paper)
+            if not papers:
+                del store[key][entryhash]
+        if not store[key]:
+            del store[key]
+
+
+def updatestore(storedir: str, paper: str, entries: dict, render):
+    """Update store with entries (key, hash): bib cited in paper.
+
+    Entries are rendered with render(key, bib, anchor) only when the key and
+    hash are not in the store yet. The store keeps each variant of same key
+    separately and remembers which papers cite it, so papers with different
+    bib data for same key don't overwrite each other and variants no paper
+    cites anymore are dropped. Files are only rewritten when something
+    changed.
+    """
+    with lockedstore(storedir):
+        store = readstore(storedir)
+        oldstore = json.dumps(store, sort_keys=True)
+        forgetpaper(store, paper, entries)
+        for (key, entryhash), bib in entries.items():
+            variants = store.setdefault(key, {})
+            if entryhash not in variants:
+                variants[entryhash] = {
+                    "markdown": render(key, bib, bibanchor(key, entryhash)),
+                    "papers": []}
+            entry = variants[entryhash]
+            entry["papers"] = sorted(set(entry["papers"]) | {paper})
+            if len(variants) > 1:
+                others = set()
+                for otherhash, other in variants.items():
+                    if otherhash != entryhash:
+                        others.update(other["papers"])
+                print(f"bib data for {key} differs from the one in "
+                      f"{', '.join(sorted(others))}, keeping both in shared "
+                      "references", file=sys.stderr)
+        changed = json.dumps(store, sort_keys=True) != oldstore
+        if changed:
+            writestorefile(storedir, "citations.json",
+                           json.dumps(store, indent=1, sort_keys=True))
+        refsfile = os.path.join(storedir, "references.md")
+        if changed or not os.path.exists(refsfile):
+            writestorefile(storedir, "references.md",
+                           renderreferences(store))
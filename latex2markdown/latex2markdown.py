@@ -5,7 +5,153 @@ import os
 import re
 import sys
 from argparse import ArgumentParser, FileType
-from datetime import datetime
+from functools import lru_cache
+
+# Regular expression rules used in conversion, as name: (trigger, pattern,
+# flags). Rules are compiled on first use only and skipped altogether when
+# the trigger string is not in the document, so that short documents don't
+# pay for compiling all of them on each run.
+RULES = {
+    # bib
+    "forcecaps": ("{", r"{([A-Z]{1,6})}", 0),
+    # preamble
+    "documentclass": ("\\documentclass",
+                      r"\\documentclass(\[[^]]*\])?({[^}]*})", 0),
+    "usepackage": ("\\usepackage", r"\\usepackage(\[[^]]*\])?{([^}]*)}", 0),
+    "requirepackage": ("\\RequirePackage",
+                       r"\\RequirePackage(\[[^]]*\])?{([^}]*)}", 0),
+    "usetikzlibrary": ("\\usetikzlibrary",
+                       r"\\usetikzlibrary(\[[^]]*\])?{([^}]*)}", 0),
+    # programming and macros
+    "newcommand": ("\\newcommand", r"\\newcommand\\([^{]*){.*}", 0),
+    "newcommandbrace": ("\\newcommand", r"\\newcommand{([^{]*)}{.*}", 0),
+    "renewcommand": ("\\renewcommand",
+                     r"\\renewcommand\*{([^]}]*)}{([^}]*)}", 0),
+    "newif": ("\\newif", r"\\newif\\(\w*)", 0),
+    "ifsomething": ("\\if", r"\\if(\w*)", 0),
+    "setlength": ("\\setlength", r"\\setlength{([^{]*)}{([^}]*)}", 0),
+    "setlengthstar": ("\\setlength", r"\\setlength\*{([^{]*)}{([^}]*)}", 0),
+    "setcounter": ("\\setcounter", r"\\setcounter{([^{]*)}{([^}]*)}", 0),
+    "setmainlanguage": ("\\setmainlanguage",
+                        r"\\setmainlanguage(\[[^]]*\])?{([^}]*)}", 0),
+    "setotherlanguages": ("\\setotherlanguages",
+                          r"\\setotherlanguages{([^}]*)}", 0),
+    # labels, refs and bibs
+    "label": ("\\label", r"\\label{([^}]*)}", 0),
+    "ref": ("\\ref", r"\\ref{([^}]*)}", 0),
+    "bibliography": ("\\bibliography", r"\\bibliography{([^}]*)}", 0),
+    "cite": ("\\cite", r"\\cite[tp]?(\[[^]]*\])?{([^}]*)}", 0),
+    "bibliographystyle": ("\\bibliographystyle",
+                          r"\\bibliographystyle{([^}]*)}", 0),
+    # tabulars
+    "multicol": ("\\multicolumn", r"\\multicolumn{([^}]*)}{([^}]*)}", 0),
+    "tabular": ("\\begin{tabular}", r" *\\begin{tabular}.*?\\end{tabular}",
+                re.MULTILINE | re.DOTALL),
+    "tabularx": ("\\begin{tabularx}",
+                 r" *\\begin{tabularx}.*?\\end{tabularx}",
+                 re.MULTILINE | re.DOTALL),
+    # small local things
+    "math": ("$", r"\$([^$]*)\$", 0),
+    "verbpipe": ("\\verb|", r"\\verb\|([^|]*)\|", 0),
+    "url": ("\\url", r"\\url{([^}]*)}", re.MULTILINE),
+    "href": ("\\href", r"\\href{([^}]*)}{([^}]*)}", re.MULTILINE),
+    "texttt": ("\\texttt", r"\\texttt{([^}]*)}", re.MULTILINE),
+    "textbf": ("\\textbf", r"\\textbf{([^}]*)}", re.MULTILINE),
+    "textit": ("\\textit", r"\\textit{([^}]*)}", re.MULTILINE),
+    "emph": ("\\emph", r"\\emph{([^}]*)}", re.MULTILINE),
+    "textsc": ("\\textsc", r"\\textsc{([^}]*)}", re.MULTILINE),
+    "footnote": ("\\footnote", r"\\footnote{([^}]*)}", re.MULTILINE),
+    "textcolor": ("\\textcolor", r"\\textcolor{([^}]*)}{([^}]*)}",
+                  re.MULTILINE),
+    "caption": ("\\caption", r"\\caption{([^}]*)}", re.MULTILINE),
+    "underline": ("\\underline", r"\\underline{([^}]*)}", re.MULTILINE),
+    "definecolor": ("\\definecolor",
+                    r"\\definecolor{([^}]*)}{([^}]*)}{([^}]*)}", 0),
+    "hyphenation": ("\\hyphenation", r"\\hyphenation{([^}]*)}", 0),
+    # flammie specific
+    "aappd": ("\\aclanthologypostprintdoi",
+              r"\\aclanthologypostprintdoi{([^}]*)}", 0),
+    "springer": ("\\springerpostprintdoi",
+                 r"\\springerpostprintdoi{([^}]*)}", 0),
+    "fnpr": ("\\footnotepubrights", r"\\footnotepubrights{([^}]*)}",
+             re.MULTILINE),
+    "gecfail": ("\\gecfail", r"\\gecfail{([^}]*)}", 0),
+    "mispelt": ("\\mispelt", r"\\mispelt{([^}]*)}", 0),
+    "misspelt": ("\\misspelt", r"\\misspelt{([^}]*)}", 0),
+    # graphics
+    "includegraphics": ("\\includegraphics",
+                        r"\\includegraphics(\[[^]]*\])?{([^}]*)}", 0),
+    "scalebox": ("\\scalebox", r"\\scalebox{([^}]*)}(\[[^]]*\])?{([^}]*)}",
+                 0),
+    # linguistics
+    "pex": ("\\pex", r"\\pex&lt;([^&]*)&gt;", 0),
+    "expexa": ("\\a", r"^\\a$", re.MULTILINE),
+    "tcolorbox": ("\\begin{tcolorbox}",
+                  r"\\begin{tcolorbox}\s*\[([^]]*)\](.*?)\\end{tcolorbox}",
+                  re.MULTILINE | re.DOTALL),
+    "selectlanguage": ("\\selectlanguage", r"\\selectlanguage{([^}]*)}", 0),
+    # layout nonsense
+    "minipage": ("\\begin{minipage}", r"\\begin{minipage}{([^}]*)}", 0),
+    "multicols": ("\\begin{multicols}", r"\\begin{multicols}{([^}]*)}", 0),
+    "vspace": ("\\vspace", r"\\vspace{([^}]*)}", 0),
+    "hspace": ("\\hspace", r"\\hspace{([^}]*)}", 0),
+    "pagestyle": ("\\pagestyle", r"\\pagestyle{([^}]*)}", 0),
+    "thispagestyle": ("\\thispagestyle", r"\\thispagestyle{([^}]*)}", 0),
+    "linespread": ("\\linespread", r"\\linespread{([^}]*)}", 0),
+    "defaultfontfeatures": ("\\defaultfontfeatures",
+                            r"\\defaultfontfeatures{([^}]*)}", 0),
+    "setmainfont": ("\\setmainfont", r"\\setmainfont(\[[^]]*\])?{([^}]*)}",
+                    0),
+    "setlist": ("\\setlist", r"\\setlist(\[[^]]*\])?{([^}]*)}", 0),
+    # lists
+    "itemize": ("\\begin{itemize}", r"\\begin{itemize}.*?\\end{itemize}",
+                re.MULTILINE | re.DOTALL),
+    "enumerate": ("\\begin{enumerate}",
+                  r"\\begin{enumerate}.*?\\end{enumerate}",
+                  re.MULTILINE | re.DOTALL),
+    "enumstar": ("\\begin{enumerate*}",
+                 r"\\begin{enumerate\*}.*?\\end{enumerate\*}",
+                 re.MULTILINE | re.DOTALL),
+    # sectioning
+    "chapter": ("\\chapter", r"\\chapter{([^}]*)}", re.MULTILINE),
+    "section": ("\\section", r"\\section{([^}]*)}", re.MULTILINE),
+    "subsection": ("\\subsection", r"\\subsection{([^}]*)}", re.MULTILINE),
+    "subsubsection": ("\\subsubsection", r"\\subsubsection{([^}]*)}",
+                      re.MULTILINE),
+    "chapterstar": ("\\chapter*", r"\\chapter\*{([^}]*)}", re.MULTILINE),
+    "sectionstar": ("\\section*", r"\\section\*{([^}]*)}", re.MULTILINE),
+    "subsectionstar": ("\\subsection*", r"\\subsection\*{([^}]*)}",
+                       re.MULTILINE),
+    "subsubsectionstar": ("\\subsubsection*", r"\\subsubsection\*{([^}]*)}",
+                          re.MULTILINE),
+    # title stuffs
+    "title": ("\\title", r"\\title{([^}]*)}", re.MULTILINE),
+    "author": ("\\author", r"\\author{([^}]*)}", re.MULTILINE),
+    "date": ("\\date", r"\\date{([^}]*)}", 0),
+    # final fixes
+    "chomp": ("", r"^[ \t]*(\*\*|<!--|\(Caption|\w|!\[)", re.MULTILINE),
+}
+
+
+@lru_cache(maxsize=None)
+def rule(name: str) -> re.Pattern:
+    """Compile named rule from RULES on first use."""
+    _, pattern, flags = RULES[name]
+    return re.compile(pattern, flags)
+
+
+def subrule(name: str, repl: str, latex: str) -> str:
+    """Substitute named rule in latex if its trigger is found."""
+    if RULES[name][0] not in latex:
+        return latex
+    return rule(name).sub(repl, latex)
+
+
+def findallrule(name: str, latex: str) -> list:
+    """Find all matches of named rule in latex if its trigger is found."""
+    if RULES[name][0] not in latex:
+        return []
+    return rule(name).findall(latex)
 
 
 def readbibs(relpath: str, bibfiles: str) -> dict():
@@ -57,8 +203,7 @@ def readbib(relpath: str, bibfile: str) -> dict():
                 elif stuff.endswith("},") or stuff.endswith("\","):
                     stuff = stuff[:-2]
                 # fix escapes here already, there's more crap in bib than tex
-                forcecapsre = re.compile(r"{([A-Z]{1,6})}")
-                stuff = forcecapsre.sub(r"\1", stuff)
+                stuff = subrule("forcecaps", r"\1", stuff)
                 stuff = stuff.replace(r"{\'a}", "á")
                 stuff = stuff.replace(r"{\'c}", "ć")
                 stuff = stuff.replace(r"{\'e}", "é")
@@ -103,137 +248,20 @@ def readbib(relpath: str, bibfile: str) -> dict():
     return bib
 
 
-def main():
-    """CLI for latex to markdown conversion."""
-    ap = ArgumentParser()
-    ap.add_argument("-i", "--input", metavar="INFILE", type=open,
-                    dest="infile", help="read vislcg3 data from INFILE")
-    ap.add_argument("-o", "--output", metavar="OUTFILE", type=FileType("w"),
-                    dest="outfile", help="write UD to OUTFILE")
-    ap.add_argument("-v", "--verbose", action="store_true", default=False,
-                    help="print verbosely while processing")
-    opts = ap.parse_args()
-    relpath = os.getcwd()
-    if not opts.infile:
-        opts.infile = sys.stdin
-        print("reading from <stdin>")
-    else:
-        relpath = os.path.dirname(os.path.realpath(opts.infile.name))
-    if not opts.outfile:
-        opts.outfile = sys.stdout
-    latex = ""
-    # read in and remvoe comments
-    for line in opts.infile.readlines():
-        if "%" in line:
-            line = line.replace("\\%", "§PERCENT§")
-            line = line.split("%")[0].replace("§PERCENT§", "%")
-        latex = latex + line
-    # get rid of html / markdown problems
-    latex = latex.replace("<", "&lt;")
-    latex = latex.replace(">", "&gt;")
-    # document class
-    documentclassre = re.compile(r"\\documentclass(\[[^]]*\])?({[^}]*})")
-    documentclasses = documentclassre.findall(latex)
-    if len(documentclasses) == 0:
-        print("Coildn't find documentclass maybe not latex", file=sys.stderr)
-        sys.exit(1)
-    elif len(documentclasses) > 1:
-        print("Found too many documentclasses", file=sys.stderr)
-        sys.exit(1)
-    # headings
-    documentclass = documentclasses[0][1]
-    dcoptions = documentclass[0][0]
-    latex = documentclassre.sub("", latex)
-    usepackagere = re.compile(r"\\usepackage(\[[^]]*\])?{([^}]*)}")
-    usepackages = usepackagere.findall(latex)
-    usedpackages = []
-    for usepackage in usepackages:
-        usedpackages.append(usepackage[1])
-    latex = usepackagere.sub(r"<!-- usepackage \2 \1 -->", latex)
-    requirepackagere = re.compile(r"\\RequirePackage(\[[^]]*\])?{([^}]*)}")
-    requirepackages = requirepackagere.findall(latex)
-    for requirepackage in requirepackages:
-        usedpackages.append(requirepackage[1])
-    latex = requirepackagere.sub(r"<!-- RequirePackage \1 -->", latex)
-    usetikzlibraryre = re.compile(r"\\usetikzlibrary(\[[^]]*\])?{([^}]*)}")
-    latex = usetikzlibraryre.sub(r"<!-- usetikzlibrary \2 \1 -->", latex)
-    # no programming and macros
-    newcommandre = re.compile(r"\\newcommand\\([^{]*){.*}")
-    latex = newcommandre.sub(r"<!-- new command \1 -->", latex)
-    newcommandre = re.compile(r"\\newcommand{([^{]*)}{.*}")
-    latex = newcommandre.sub(r"<!-- new command \1 -->", latex)
-    renewcommandre = re.compile(r"\\renewcommand\*{([^]}]*)}{([^}]*)}")
-    latex = renewcommandre.sub(r"<!-- renew command \1 \2 -->", latex)
-    newifre = re.compile(r"\\newif\\(\w*)")
-    latex = newifre.sub(r"<!-- new if \1 -->", latex)
-    ifsomethingre = re.compile(r"\\if(\w*)")
-    latex = ifsomethingre.sub(r"<!-- if \1 -->", latex)
-    latex = latex.replace("\\fi", "<!-- fi -->")
-    latex = latex.replace("\\makeatletter", "<!-- makeatletter -->")
-    latex = latex.replace("\\makeatother", "<!-- makeatother -->")
-    setlengthre = re.compile(r"\\setlength{([^{]*)}{([^}]*)}")
-    latex = setlengthre.sub(r"<!-- set length \1 \2 -->", latex)
-    setlengthstarre = re.compile(r"\\setlength\*{([^{]*)}{([^}]*)}")
-    latex = setlengthstarre.sub(r"<!-- set length * \1 \2 -->", latex)
-    setcounterre = re.compile(r"\\setcounter{([^{]*)}{([^}]*)}")
-    latex = setcounterre.sub(r"<!-- set counter \1 \2 -->", latex)
-    setmainlanguagere = re.compile(r"\\setmainlanguage(\[[^]]*\])?{([^}]*)}")
-    latex = setmainlanguagere.sub(r"<!-- set main language \2 \1 -->", latex)
-    setotherlanguagesre = re.compile(r"\\setotherlanguages{([^}]*)}")
-    latex = setotherlanguagesre.sub(r"<!-- set main language \1 -->", latex)
-    # contents
-    # need some tracking for labels and refs
-    # then cites and bibstuff
-    labelre = re.compile(r"\\label{([^}]*)}")
-    labels = labelre.findall(latex)
-    labelmap = {}
-    labelcount = 1
-    for label in labels:
-        if label in labelmap:
-            print(f"Duplicate label {label}! References may fail",
-                  file=sys.stderr)
-        else:
-            labelmap[label] = "LABEL " + label
-            labelcount = labelcount + 1
-    latex = labelre.sub("<a id=\"\\1\">(¶ \\1)</a>", latex)
-    refre = re.compile(r"\\ref{([^}]*)}")
-    refs = refre.findall(latex)
-    for ref in refs:
-        if ref not in labelmap:
-            print(f"ref to missing label {ref}, generating borken links",
-                  file=sys.stderr)
-    latex = refre.sub("[(see: \\1)](#\\1)", latex)
-    # bibliographies... absolute first fist
-    bibliographyre = re.compile(r"\\bibliography{([^}]*)}")
-    bibs = bibliographyre.findall(latex)
-    bibmap = {}
-    for bib in bibs:
-        bibmap.update(readbibs(relpath, bib))
-    citere = re.compile(r"\\cite[tp]?(\[[^]]*\])?{([^}]*)}")
-    cites = citere.findall(latex)
-    usedbibs = {}
-    for citegroup in cites:
-        for cite in citegroup[1].split(","):
-            if cite in bibmap:
-                usedbibs[cite] = bibmap[cite]
-            else:
-                print(f"bib data for {cite} missing, generating broken "
-                      "citation", file=sys.stderr)
-                usedbibs[cite] = {"error": "<strong style=\"color: red\">"
-                                           "missing from bibs"
-                                           "</strong>"}
-    latex = citere.sub("[(cites: \\2\\1)](#\\2)", latex)
-    bibcontent = "# References\n\n"
-    # no support for bibliography styles, we just dump all available data
-    bibliographystylere = re.compile(r"\\bibliographystyle{([^}]*)}")
-    latex = bibliographystylere.sub(r"<!-- bib style: \1 -->", latex)
-    for key, bib in usedbibs.items():
-        bibcontent += f"* <a id=\"{key}\">**{key}**</a>:\n"
-        for k, v in bib.items():
-            if len(v) > 60:
-                v = v[:60] + "..."
-            bibcontent += f"    * {k}: {v}\n"
-    latex = bibliographyre.sub(bibcontent.replace("\\", "\\\\"), latex)
+def renderbib(key: str, bib: dict, anchor: str = None) -> str:
+    """Render one bib entry as markdown list item."""
+    if anchor is None:
+        anchor = key
+    lines = [f"* <a id=\"{anchor}\">**{key}**</a>:\n"]
+    for k, v in bib.items():
+        if len(v) > 60:
+            v = v[:60] + "..."
+        lines.append(f"    * {k}: {v}\n")
+    return "".join(lines)
+
+
+def convertbody(latex: str) -> str:
+    """Convert latex document body after preamble and bibliographies."""
     # hand-written bibs eww
     latex = latex.replace(r"\begin{thebibliography}", "# References")
     latex = latex.replace(r"\bibitem", "* ")
@@ -299,11 +327,8 @@ def main():
     latex = latex.replace("\\mathcal{F}", "𝓕")
     latex = latex.replace("_{x}", "ₓ")
     # tabulars...
-    multicolre = re.compile(r"\\multicolumn{([^}]*)}{([^}]*)}")
-    latex = multicolre.sub(r"| <!-- FIXME: multicolumn \1 \2 -->", latex)
-    tabularre = re.compile(r" *\\begin{tabular}.*?\\end{tabular}",
-                           re.MULTILINE | re.DOTALL)
-    tabulars = tabularre.findall(latex)
+    latex = subrule("multicol", r"| <!-- FIXME: multicolumn \1 \2 -->", latex)
+    tabulars = findallrule("tabular", latex)
     tablecontent = ""
     for tabular in tabulars:
         tablecontent = tabular
@@ -343,9 +368,7 @@ def main():
             else:
                 tablefinal += line + "\n"
         latex = latex.replace(tabular, "\n\n" + tablefinal)
-    tabularxre = re.compile(r" *\\begin{tabularx}.*?\\end{tabularx}",
-                            re.MULTILINE | re.DOTALL)
-    tabularxs = tabularxre.findall(latex)
+    tabularxs = findallrule("tabularx", latex)
     tablecontent = ""
     for tabularx in tabularxs:
         tablecontent = tabularx
@@ -388,90 +411,69 @@ def main():
     # all items that are "outside" environments just turn into list items
     latex = latex.replace("\\item", "* ")
     # small local things first
-    mathre = re.compile(r"\$([^$]*)\$")
-    latex = mathre.sub(r"<span class='math'>\1</span>", latex)
+    latex = subrule("math", r"<span class='math'>\1</span>", latex)
     latex = latex.replace(r"\(", "<span class='math'>")
     latex = latex.replace(r"\)", "</span>")
     latex = latex.replace(r"\[", "<div class='math'>")
     latex = latex.replace(r"\]", "</div>")
-    verbpipere = re.compile(r"\\verb\|([^|]*)\|")
-    latex = verbpipere.sub(r"`\1`", latex)
-    urlre = re.compile(r"\\url{([^}]*)}", re.MULTILINE)
-    latex = urlre.sub(r"<\1>", latex)
-    hrefre = re.compile(r"\\href{([^}]*)}{([^}]*)}", re.MULTILINE)
-    latex = hrefre.sub(r"[\2](\1)", latex)
-    textttre = re.compile(r"\\texttt{([^}]*)}", re.MULTILINE)
-    latex = textttre.sub(r"`\1`", latex)
-    textbfre = re.compile(r"\\textbf{([^}]*)}", re.MULTILINE)
-    latex = textbfre.sub(r"**\1**", latex)
-    textitre = re.compile(r"\\textit{([^}]*)}", re.MULTILINE)
-    latex = textitre.sub(r"*\1*", latex)
-    emphre = re.compile(r"\\emph{([^}]*)}", re.MULTILINE)
-    latex = emphre.sub(r"*\1*", latex)
-    textscre = re.compile(r"\\textsc{([^}]*)}", re.MULTILINE)
-    latex = textscre.sub(r"<span style='font-variant: small-caps'>\1</span>",
-                         latex)
-    footnotere = re.compile(r"\\footnote{([^}]*)}", re.MULTILINE)
-    latex = footnotere.sub(r" (footnote: \1)", latex)
-    textcolorre = re.compile(r"\\textcolor{([^}]*)}{([^}]*)}", re.MULTILINE)
-    latex = textcolorre.sub(r"<span style='color: \1'>\2</span>", latex)
+    latex = subrule("verbpipe", r"`\1`", latex)
+    latex = subrule("url", r"<\1>", latex)
+    latex = subrule("href", r"[\2](\1)", latex)
+    latex = subrule("texttt", r"`\1`", latex)
+    latex = subrule("textbf", r"**\1**", latex)
+    latex = subrule("textit", r"*\1*", latex)
+    latex = subrule("emph", r"*\1*", latex)
+    latex = subrule("textsc",
+                    r"<span style='font-variant: small-caps'>\1</span>",
+                    latex)
+    latex = subrule("footnote", r" (footnote: \1)", latex)
+    latex = subrule("textcolor", r"<span style='color: \1'>\2</span>", latex)
     latex = latex.replace("\\appendix", "* * *\n\n# Appendix\n")
-    captionre = re.compile(r"\\caption{([^}]*)}", re.MULTILINE)
-    latex = captionre.sub(r" (Caption: \1)", latex)
-    underlinere = re.compile(r"\\underline{([^}]*)}", re.MULTILINE)
-    latex = underlinere.sub(r"<span style='text-underline: thin black single'>"
-                            r"\1**</span>", latex)
-    definecolorre = re.compile(r"\\definecolor{([^}]*)}{([^}]*)}{([^}]*)}")
-    latex = definecolorre.sub(r"<!-- definecolor \1 \2 \3 -->", latex)
-    hyphenationre = re.compile(r"\\hyphenation{([^}]*)}")
-    latex = hyphenationre.sub(r"<!-- hyphenation \1 -->", latex)
+    latex = subrule("caption", r" (Caption: \1)", latex)
+    latex = subrule("underline",
+                    r"<span style='text-underline: thin black single'>"
+                    r"\1**</span>", latex)
+    latex = subrule("definecolor", r"<!-- definecolor \1 \2 \3 -->", latex)
+    latex = subrule("hyphenation", r"<!-- hyphenation \1 -->", latex)
     # flammie specific
-    aappdre = re.compile(r"\\aclanthologypostprintdoi{([^}]*)}")
-    latex = aappdre.sub("Publisher’s version available at [ACL Anthology "
-                        r"identifier: \1](https://aclanthology.org/\1). "
-                        "All modern "
-                        "ACL conferences are open access usually CC BY",
-                        latex)
-    springerre = re.compile(r"\\springerpostprintdoi{([^}]*)}")
-    latex = springerre.sub("Publisher’s version available at [Springer via "
-                           r"doi: \1](https://dx.doi.org/\1). For more "
-                           "information, see [Springers self archiving "
-                           "policy]"
-                           "(http://www.springer.com/gp/open-access/"
-                           "authors-rights/self-archiving-policy/2124).",
-                           latex)
-    fnprre = re.compile(r"\\footnotepubrights{([^}]*)}", re.MULTILINE)
-    latex = fnprre.sub("¹\n§TITLEFOOTNOTE§"
-                       "<span style='font-size:8pt'>(¹ Authors' archival "
-                       r"version: \1)</span>", latex)
+    latex = subrule("aappd",
+                    "Publisher’s version available at [ACL Anthology "
+                    r"identifier: \1](https://aclanthology.org/\1). "
+                    "All modern "
+                    "ACL conferences are open access usually CC BY",
+                    latex)
+    latex = subrule("springer",
+                    "Publisher’s version available at [Springer via "
+                    r"doi: \1](https://dx.doi.org/\1). For more "
+                    "information, see [Springers self archiving "
+                    "policy]"
+                    "(http://www.springer.com/gp/open-access/"
+                    "authors-rights/self-archiving-policy/2124).",
+                    latex)
+    latex = subrule("fnpr", "¹\n§TITLEFOOTNOTE§"
+                    "<span style='font-size:8pt'>(¹ Authors' archival "
+                    r"version: \1)</span>", latex)
     # also my stuff
-    gecfail = re.compile(r"\\gecfail{([^}]*)}")
-    latex = gecfail.sub(r"<span style='text-decoration-line: "
-                        r"grammar-error'>\1</span>",
-                        latex)
-    spellfail = re.compile(r"\\mispelt{([^}]*)}")
-    latex = spellfail.sub(r"<span style='text-decoration-line: "
-                          r"spelling-error'>\1</span>",
-                          latex)
-    spellfail = re.compile(r"\\misspelt{([^}]*)}")
-    latex = spellfail.sub(r"<span style='text-decoration-line: "
-                          r"spelling-error'>\1</span>",
-                          latex)
+    latex = subrule("gecfail", r"<span style='text-decoration-line: "
+                    r"grammar-error'>\1</span>",
+                    latex)
+    latex = subrule("mispelt", r"<span style='text-decoration-line: "
+                    r"spelling-error'>\1</span>",
+                    latex)
+    latex = subrule("misspelt", r"<span style='text-decoration-line: "
+                    r"spelling-error'>\1</span>",
+                    latex)
     # includegraphics...
     # \includegraphics[width=.5\textwidth]{syntaxflow.png}
-    includegraphicsre = re.compile(r"\\includegraphics(\[[^]]*\])?{([^}]*)}")
-    latex = includegraphicsre.sub(r"![\2](\2)", latex)
-    scaleboxre = re.compile(r"\\scalebox{([^}]*)}(\[[^]]*\])?{([^}]*)}")
-    latex = scaleboxre.sub(r"<!-- scalebox \1 \2 -->\n\3", latex)
+    latex = subrule("includegraphics", r"![\2](\2)", latex)
+    latex = subrule("scalebox", r"<!-- scalebox \1 \2 -->\n\3", latex)
     # Linguistics
     latex = latex.replace("\\ex.", "**Linguistic examples:**\n\n")
     latex = latex.replace("\\exg.", "**Linguistic example group:**\n\n")
     latex = latex.replace("\\ag.", "a. ")
     latex = latex.replace("\\b.", "b. ")
-    pexre = re.compile(r"\\pex&lt;([^&]*)&gt;")
-    latex = pexre.sub(r"**Linguistic example group \1:**\n\n", latex)
-    expexare = re.compile(r"^\\a$", re.MULTILINE)
-    latex = expexare.sub("<!-- a -->", latex)
+    latex = subrule("pex", r"**Linguistic example group \1:**\n\n", latex)
+    latex = subrule("expexa", "<!-- a -->", latex)
     latex = latex.replace("\\begingl", "<!-- begingl -->")
     latex = latex.replace("\\gla ", "* surface: ")
     latex = latex.replace("\\glb ", "* glosses: ")
@@ -489,12 +491,9 @@ def main():
     latex = latex.replace("\\ENDIF ", "1. ENDIF } ")
     latex = latex.replace("\\COMMENT", "1. // ")
     # tcolorbox
-    tcolorboxre = re.compile(r"\\begin{tcolorbox}"
-                             r"\s*\[([^]]*)\](.*?)"
-                             r"\\end{tcolorbox}", re.MULTILINE | re.DOTALL)
-    latex = tcolorboxre.sub(r"<div style='border: black solid 5px;"
-                            r" background-color: lightgray; color: black'>"
-                            r"\2</div>", latex)
+    latex = subrule("tcolorbox", r"<div style='border: black solid 5px;"
+                    r" background-color: lightgray; color: black'>"
+                    r"\2</div>", latex)
     # even more simple stuffs
     latex = latex.replace("\\begin{document}", "<!-- begin document -->")
     latex = latex.replace("\\end{document}", "<!-- end document -->")
@@ -547,8 +546,7 @@ def main():
     # languages in multilingual docs
     latex = latex.replace("\\begin{english}", "<span xml:lang=\"en\">")
     latex = latex.replace("\\end{english}", "</span>")
-    selectlanguagere = re.compile(r"\\selectlanguage{([^}]*)}")
-    latex = selectlanguagere.sub(r"<!-- select language \1 -->", latex)
+    latex = subrule("selectlanguage", r"<!-- select language \1 -->", latex)
     # things that cannot be handled properly...
     # these are kind of trigger commands that change whole rest of the "block"
     # figuring out where the block ends is a hard problem
@@ -561,36 +559,25 @@ def main():
     latex = latex.replace("\\it ", "<!-- it -->")
     latex = latex.replace("\\tt ", "<!-- tt -->")
     # layout nonsense
-    minipagere = re.compile(r"\\begin{minipage}{([^}]*)}")
-    latex = minipagere.sub(r"<!-- minipage \1 -->", latex)
+    latex = subrule("minipage", r"<!-- minipage \1 -->", latex)
     latex = latex.replace("\\end{minipage}", "<!-- /minipage -->")
-    multicolsre = re.compile(r"\\begin{multicols}{([^}]*)}")
-    latex = multicolsre.sub(r"<!-- multicols \1 -->", latex)
+    latex = subrule("multicols", r"<!-- multicols \1 -->", latex)
     latex = latex.replace("\\end{multicols}", "<!-- /multicols -->")
     # useless tweaks (in markdown / html context)
     latex = latex.replace("\\relax", "<!-- relax -->")
     latex = latex.replace("\\noindent", "<!-- no indent -->")
     latex = latex.replace("\\newpage", "<!-- new page -->")
-    vspacere = re.compile(r"\\vspace{([^}]*)}")
-    latex = vspacere.sub(r"<!-- vspace \1 -->", latex)
-    hspacere = re.compile(r"\\hspace{([^}]*)}")
-    latex = hspacere.sub(r"<!-- hspace \1 -->", latex)
-    pagestylere = re.compile(r"\\pagestyle{([^}]*)}")
-    latex = pagestylere.sub(r"<!-- pagestyle \1 -->", latex)
-    thispagestylere = re.compile(r"\\thispagestyle{([^}]*)}")
-    latex = thispagestylere.sub(r"<!-- thispagestyle \1 -->", latex)
-    linespreadre = re.compile(r"\\linespread{([^}]*)}")
-    latex = linespreadre.sub(r"<!-- linespread \1 -->", latex)
-    defaultfontfeaturesre = re.compile(r"\\defaultfontfeatures{([^}]*)}")
-    latex = defaultfontfeaturesre.sub(r"<!-- default font feat \1 -->", latex)
-    setmainfontre = re.compile(r"\\setmainfont(\[[^]]*\])?{([^}]*)}")
-    latex = setmainfontre.sub(r"<!-- set main font \2 \1 -->", latex)
-    setlistre = re.compile(r"\\setlist(\[[^]]*\])?{([^}]*)}")
-    latex = setlistre.sub(r"<!-- set list \2 \1 -->", latex)
+    latex = subrule("vspace", r"<!-- vspace \1 -->", latex)
+    latex = subrule("hspace", r"<!-- hspace \1 -->", latex)
+    latex = subrule("pagestyle", r"<!-- pagestyle \1 -->", latex)
+    latex = subrule("thispagestyle", r"<!-- thispagestyle \1 -->", latex)
+    latex = subrule("linespread", r"<!-- linespread \1 -->", latex)
+    latex = subrule("defaultfontfeatures", r"<!-- default font feat \1 -->",
+                    latex)
+    latex = subrule("setmainfont", r"<!-- set main font \2 \1 -->", latex)
+    latex = subrule("setlist", r"<!-- set list \2 \1 -->", latex)
     # lists
-    itemizere = re.compile(r"\\begin{itemize}.*?\\end{itemize}",
-                           re.MULTILINE | re.DOTALL)
-    itemizes = itemizere.findall(latex)
+    itemizes = findallrule("itemize", latex)
     itemizecontent = ""
     for itemize in itemizes:
         itemizecontent = itemize
@@ -598,9 +585,7 @@ def main():
         itemizecontent = itemizecontent.replace(r"\end{itemize}", "")
         itemizecontent = itemizecontent.replace(r"\item ", "* ")
         latex = latex.replace(itemize, itemizecontent)
-    enumeratere = re.compile(r"\\begin{enumerate}.*?\\end{enumerate}",
-                             re.MULTILINE | re.DOTALL)
-    enumerates = enumeratere.findall(latex)
+    enumerates = findallrule("enumerate", latex)
     enumeratecontent = ""
     for enumrate in enumerates:
         enumeratecontent = enumrate
@@ -608,9 +593,7 @@ def main():
         enumeratecontent = enumeratecontent.replace(r"\end{enumerate}", "")
         enumeratecontent = enumeratecontent.replace(r"\item ", "1. ")
         latex = latex.replace(enumrate, enumeratecontent)
-    enumstarre = re.compile(r"\\begin{enumerate\*}.*?\\end{enumerate\*}",
-                            re.MULTILINE | re.DOTALL)
-    enumstars = enumstarre.findall(latex)
+    enumstars = findallrule("enumstar", latex)
     enumstarcontent = ""
     for enumstar in enumstars:
         enumstarcontent = enumstar
@@ -619,48 +602,23 @@ def main():
         enumstarcontent = enumstarcontent.replace(r"\item ", " ")
         latex = latex.replace(enumstar, enumstarcontent)
     # stuffs
-    chapterre = re.compile(r"\\chapter{([^}]*)}", re.MULTILINE)
-    latex = chapterre.sub(r"# \1", latex)
-    sectionre = re.compile(r"\\section{([^}]*)}", re.MULTILINE)
-    latex = sectionre.sub(r"## \1", latex)
-    subsectionre = re.compile(r"\\subsection{([^}]*)}", re.MULTILINE)
-    latex = subsectionre.sub(r"### \1", latex)
-    subsubsectionre = re.compile(r"\\subsubsection{([^}]*)}", re.MULTILINE)
-    latex = subsubsectionre.sub(r"#### \1", latex)
-    chapterre = re.compile(r"\\chapter\*{([^}]*)}", re.MULTILINE)
-    latex = chapterre.sub(r"# \1", latex)
-    sectionre = re.compile(r"\\section\*{([^}]*)}", re.MULTILINE)
-    latex = sectionre.sub(r"## \1", latex)
-    subsectionre = re.compile(r"\\subsection\*{([^}]*)}", re.MULTILINE)
-    latex = subsectionre.sub(r"### \1", latex)
-    subsubsectionre = re.compile(r"\\subsubsection\*{([^}]*)}", re.MULTILINE)
-    latex = subsubsectionre.sub(r"#### \1", latex)
-    # more contentful stuffs agan
-    titlere = re.compile(r"\\title{([^}]*)}", re.MULTILINE)
-    titles = titlere.findall(latex)
-    if len(titles) == 0:
-        print("Couldn't find title maybe not document:")
-        print(latex)
-        sys.exit(1)
-    elif len(titles) > 1:
-        print("Too many titles?")
-        sys.exit(1)
-    title = titles[0].replace("\n", " ")
-    latex = titlere.sub(r"# §§§TITLE§§§", latex)
-    latex = latex.replace("§§§TITLE§§§", title)
-    latex = latex.replace("§TITLEFOOTNOTE§", "\n\n")
-    authorre = re.compile(r"\\author{([^}]*)}", re.MULTILINE)
-    latex = authorre.sub(r"**Authors:** \1", latex)
-    datere = re.compile(r"\\date{([^}]*)}")
-    latex = datere.sub(r"**Date:** \1", latex)
-    latex = latex.replace(r"\today", "(date of conversion: " +
-                          datetime.today().strftime("%Y-%m-%d") + ")")
+    latex = subrule("chapter", r"# \1", latex)
+    latex = subrule("section", r"## \1", latex)
+    latex = subrule("subsection", r"### \1", latex)
+    latex = subrule("subsubsection", r"#### \1", latex)
+    latex = subrule("chapterstar", r"# \1", latex)
+    latex = subrule("sectionstar", r"## \1", latex)
+    latex = subrule("subsectionstar", r"### \1", latex)
+    latex = subrule("subsubsectionstar", r"#### \1", latex)
+    return latex
+
+
+def finalfixes(latex: str) -> str:
+    """Fix up remaining latex-isms and markdown problems."""
     # final fixes
     # I don't use the indent as codeblock markup so de-indenting most stuff
     # will fix those problems (retain nested lists maybe?)
-    chompre = re.compile(r"^[ \t]*(\*\*|<!--|\(Caption|\w|!\[)",
-                         re.MULTILINE)
-    latex = chompre.sub(r"\1", latex)
+    latex = subrule("chomp", r"\1", latex)
     latex = latex.replace(".\\@", ".")   # inter sent spacing
     latex = latex.replace(".\\", ".")   # inter sent spacing
     latex = latex.replace("<!-- LINEBREAK -->", "\n")
@@ -674,6 +632,185 @@ def main():
     latex = latex.replace("§/SGMLCOMMENT§", "-->")
     latex = latex.replace("§TR§", "| ----")
     latex = latex.replace("{}", "")  # I use empty {} as command terminator
+    return latex
+
+
+def renderstorebib(key: str, bib: dict, anchor: str) -> str:
+    """Render bib entry for shared references page like in paper body."""
+    return finalfixes(convertbody(renderbib(key, bib, anchor)))
+
+
+def main():
+    """CLI for latex to markdown conversion."""
+    ap = ArgumentParser()
+    ap.add_argument("-i", "--input", metavar="INFILE", type=open,
+                    dest="infile", help="read vislcg3 data from INFILE")
+    ap.add_argument("-o", "--output", metavar="OUTFILE", type=FileType("w"),
+                    dest="outfile", help="write UD to OUTFILE")
+    ap.add_argument("-v", "--verbose", action="store_true", default=False,
+                    help="print verbosely while processing")
+    ap.add_argument("-c", "--citation-store", metavar="STOREDIR",
+                    dest="citationstore",
+                    help="collect references of all papers to a shared "
+                    "STOREDIR/references.md and link to it")
+    opts = ap.parse_args()
+    relpath = os.getcwd()
+    if opts.citationstore and not opts.infile:
+        print("citation store needs input file to know which paper cites "
+              "what", file=sys.stderr)
+        sys.exit(1)
+    if not opts.infile:
+        opts.infile = sys.stdin
+        print("reading from <stdin>")
+    else:
+        relpath = os.path.dirname(os.path.realpath(opts.infile.name))
+    if not opts.outfile:
+        opts.outfile = sys.stdout
+    latex = ""
+    # read in and remvoe comments
+    for line in opts.infile.readlines():
+        if "%" in line:
+            line = line.replace("\\%", "§PERCENT§")
+            line = line.split("%")[0].replace("§PERCENT§", "%")
+        latex = latex + line
+    # get rid of html / markdown problems
+    latex = latex.replace("<", "&lt;")
+    latex = latex.replace(">", "&gt;")
+    # document class
+    documentclasses = findallrule("documentclass", latex)
+    if len(documentclasses) == 0:
+        print("Coildn't find documentclass maybe not latex", file=sys.stderr)
+        sys.exit(1)
+    elif len(documentclasses) > 1:
+        print("Found too many documentclasses", file=sys.stderr)
+        sys.exit(1)
+    # headings
+    documentclass = documentclasses[0][1]
+    dcoptions = documentclass[0][0]
+    latex = subrule("documentclass", "", latex)
+    usepackages = findallrule("usepackage", latex)
+    usedpackages = []
+    for usepackage in usepackages:
+        usedpackages.append(usepackage[1])
+    latex = subrule("usepackage", r"<!-- usepackage \2 \1 -->", latex)
+    requirepackages = findallrule("requirepackage", latex)
+    for requirepackage in requirepackages:
+        usedpackages.append(requirepackage[1])
+    latex = subrule("requirepackage", r"<!-- RequirePackage \1 -->", latex)
+    latex = subrule("usetikzlibrary", r"<!-- usetikzlibrary \2 \1 -->", latex)
+    # no programming and macros
+    latex = subrule("newcommand", r"<!-- new command \1 -->", latex)
+    latex = subrule("newcommandbrace", r"<!-- new command \1 -->", latex)
+    latex = subrule("renewcommand", r"<!-- renew command \1 \2 -->", latex)
+    latex = subrule("newif", r"<!-- new if \1 -->", latex)
+    latex = subrule("ifsomething", r"<!-- if \1 -->", latex)
+    latex = latex.replace("\\fi", "<!-- fi -->")
+    latex = latex.replace("\\makeatletter", "<!-- makeatletter -->")
+    latex = latex.replace("\\makeatother", "<!-- makeatother -->")
+    latex = subrule("setlength", r"<!-- set length \1 \2 -->", latex)
+    latex = subrule("setlengthstar", r"<!-- set length * \1 \2 -->", latex)
+    latex = subrule("setcounter", r"<!-- set counter \1 \2 -->", latex)
+    latex = subrule("setmainlanguage", r"<!-- set main language \2 \1 -->",
+                    latex)
+    latex = subrule("setotherlanguages", r"<!-- set main language \1 -->",
+                    latex)
+    # contents
+    # need some tracking for labels and refs
+    # then cites and bibstuff
+    labels = findallrule("label", latex)
+    labelmap = {}
+    labelcount = 1
+    for label in labels:
+        if label in labelmap:
+            print(f"Duplicate label {label}! References may fail",
+                  file=sys.stderr)
+        else:
+            labelmap[label] = "LABEL " + label
+            labelcount = labelcount + 1
+    latex = subrule("label", "<a id=\"\\1\">(¶ \\1)</a>", latex)
+    refs = findallrule("ref", latex)
+    for ref in refs:
+        if ref not in labelmap:
+            print(f"ref to missing label {ref}, generating borken links",
+                  file=sys.stderr)
+    latex = subrule("ref", "[(see: \\1)](#\\1)", latex)
+    # bibliographies... absolute first fist
+    bibs = findallrule("bibliography", latex)
+    bibmap = {}
+    for bib in bibs:
+        bibmap.update(readbibs(relpath, bib))
+    cites = findallrule("cite", latex)
+    usedbibs = {}
+    missingbibs = set()
+    for citegroup in cites:
+        for cite in citegroup[1].split(","):
+            if cite in bibmap:
+                usedbibs[cite] = bibmap[cite]
+            else:
+                print(f"bib data for {cite} missing, generating broken "
+                      "citation", file=sys.stderr)
+                missingbibs.add(cite)
+                usedbibs[cite] = {"error": "<strong style=\"color: red\">"
+                                           "missing from bibs"
+                                           "</strong>"}
+    latex = subrule("cite", "[(cites: \\2\\1)](#\\2)", latex)
+    bibcontent = "# References\n\n"
+    # no support for bibliography styles, we just dump all available data
+    latex = subrule("bibliographystyle", r"<!-- bib style: \1 -->", latex)
+    if opts.citationstore:
+        # shared references page, just link to that from here
+        try:
+            # only import when needed, the store needs slow-ish imports
+            from latex2markdown import citationstore  # noqa: PLC0415
+        except ImportError:
+            # run as script, this file hides the package
+            import citationstore  # noqa: PLC0415
+        refspage = os.path.abspath(os.path.join(opts.citationstore,
+                                                "references.md"))
+        if opts.outfile is sys.stdout:
+            refspage = os.path.relpath(refspage)
+        else:
+            refspage = os.path.relpath(refspage, os.path.dirname(
+                os.path.abspath(opts.outfile.name)))
+        storebibs = {}
+        for key, bib in usedbibs.items():
+            if key in missingbibs:
+                bibcontent += renderbib(key, bib)
+            else:
+                entryhash = citationstore.bibhash(bib)
+                anchor = citationstore.bibanchor(key, entryhash)
+                bibcontent += (f"* <a id=\"{key}\">**{key}**</a>: "
+                               f"[see references]({refspage}#{anchor})\n")
+                storebibs[(key, entryhash)] = bib
+        citationstore.updatestore(opts.citationstore,
+                                  os.path.realpath(opts.infile.name),
+                                  storebibs, renderstorebib)
+    else:
+        for key, bib in usedbibs.items():
+            bibcontent += renderbib(key, bib)
+    latex = subrule("bibliography", bibcontent.replace("\\", "\\\\"), latex)
+    latex = convertbody(latex)
+    # more contentful stuffs agan
+    titles = findallrule("title", latex)
+    if len(titles) == 0:
+        print("Couldn't find title maybe not document:")
+        print(latex)
+        sys.exit(1)
+    elif len(titles) > 1:
+        print("Too many titles?")
+        sys.exit(1)
+    title = titles[0].replace("\n", " ")
+    latex = subrule("title", r"# §§§TITLE§§§", latex)
+    latex = latex.replace("§§§TITLE§§§", title)
+    latex = latex.replace("§TITLEFOOTNOTE§", "\n\n")
+    latex = subrule("author", r"**Authors:** \1", latex)
+    latex = subrule("date", r"**Date:** \1", latex)
+    if r"\today" in latex:
+        # only import datetime when needed, it's slow-ish on startup
+        from datetime import datetime  # noqa: PLC0415
+        latex = latex.replace(r"\today", "(date of conversion: " +
+                              datetime.today().strftime("%Y-%m-%d") + ")")
+    latex = finalfixes(latex)
     markdown = latex
     markdown = markdown + "\n* * *\n\n" + \
         "<span style='font-size: 8pt'>Converted with [Flammie’s " + \